@@ -1,191 +1,157 @@
+from __future__ import annotations
+
 import time
 import os
 import datetime
+import functools
+import hashlib
+import re
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
+import httpx
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI, OpenAIError
-import streamlit_authenticator as stauth
-
-# --- Authentication gate ----------------------------------------------------
-auth_config = st.secrets.get('auth')
-if not auth_config:
-    st.error('Auth configuration missing in secrets.')
-    st.stop()
-
-def _to_plain(obj):
-    """Convert secrets mappings to plain dicts/lists to avoid mutation issues."""
-    if isinstance(obj, dict):
-        return {k: _to_plain(v) for k, v in obj.items()}
-    try:
-        # Handles secrets-like objects that implement .items()
-        return {k: _to_plain(v) for k, v in obj.items()}
-    except Exception:
-        return obj
-
-auth_config = _to_plain(auth_config)
-
-authenticator = stauth.Authenticate(
-    auth_config['credentials'],
-    auth_config['cookie']['name'],
-    auth_config['cookie']['key'],
-    auth_config['cookie']['expiry_days'],
-)
-
-authenticator.login(
-    fields={'Form name': 'Login'},
-    location='main',
-)
-auth_status = st.session_state.get('authentication_status')
-
-if auth_status is False:
-    st.error('Invalid username or password.')
-    st.stop()
-elif auth_status is None:
-    st.warning('Please enter your credentials.')
-    st.stop()
-else:
-    authenticator.logout('Logout', 'sidebar')
-# ---------------------------------------------------------------------------
+from openai import NOT_GIVEN, DefaultHttpxClient, OpenAI, OpenAIError
+import tiktoken
+
+from auth import require_auth
 
 load_dotenv()
-OPENAI_API_KEY = st.secrets.get('OPENAI_API_KEY') or os.environ.get('OPENAI_API_KEY')
-if not OPENAI_API_KEY:
-    st.error('OPENAI_API_KEY is not set; please configure your environment (Streamlit secrets or env var).')
-    st.stop()
 OPENAI_MODEL = os.environ.get('OPENAI_MODEL') or 'gpt-4.1-nano'
+# Only the most recent user/assistant turns are sent, keeping prompt size flat as chats grow.
+# Clamped to 1: a zero would slice history[-0:], i.e. the whole chat.
+MAX_TURNS = max(1, int(os.environ.get('OPENAI_MAX_TURNS') or 20))
+# Token budget for system prompt + history, with room reserved for the reply.
+MAX_INPUT_TOKENS = int(os.environ.get('OPENAI_MAX_INPUT_TOKENS') or 16000)
+MAX_OUTPUT_TOKENS = int(os.environ.get('OPENAI_MAX_OUTPUT_TOKENS') or 2048)
+# Wait this long before retrying a failed tokenizer load.
+TOKENIZER_RETRY_SECONDS = 300
 
 
 @st.cache_resource(show_spinner=False)
 def get_openai_client(api_key: str) -> OpenAI:
-    """Cache the OpenAI client so HTTP connections can be reused across reruns."""
-    return OpenAI(api_key=api_key)
+    """Cache the OpenAI client so HTTP connections can be reused across reruns.
+
+    HTTP/2 multiplexes the SSE stream and concurrent sessions over one kept-alive
+    TLS connection instead of reconnecting per request.
+    """
+    return OpenAI(
+        api_key=api_key,
+        http_client=DefaultHttpxClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=30),
+        ),
+    )
+
+
+def get_token_encoder(model: str) -> tiktoken.Encoding:
+    """Tokenizer for the model; unknown model names fall back to the 4o-family encoding.
+
+    tiktoken keeps loaded encodings in its own registry, so repeat calls are cheap.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('o200k_base')
+
+
+@st.cache_resource(show_spinner=False)
+def _tokenizer_state() -> dict:
+    """Process-wide tokenizer load state, shared by every session."""
+    return {'lock': threading.Lock(), 'thread': None, 'encoder': None, 'retry_at': 0.0}
+
+
+def _load_tokenizer_in_background(state: dict) -> None:
+    try:
+        state['encoder'] = get_token_encoder(OPENAI_MODEL)
+    except Exception:
+        state['retry_at'] = time.monotonic() + TOKENIZER_RETRY_SECONDS
 
 
-client = get_openai_client(OPENAI_API_KEY)
+def _load_token_encoder() -> tiktoken.Encoding | None:
+    """The tokenizer once it has loaded, else None.
+
+    tiktoken fetches its BPE file on first use with no timeout, so the load runs
+    on a background thread and turns use approximate counts until it lands. A
+    failed load is retried after TOKENIZER_RETRY_SECONDS, not on every turn.
+    """
+    state = _tokenizer_state()
+    if state['encoder'] is None:
+        with state['lock']:
+            thread = state['thread']
+            if (thread is None or not thread.is_alive()) and time.monotonic() >= state['retry_at']:
+                state['thread'] = threading.Thread(
+                    target=_load_tokenizer_in_background, args=(state,), name='tiktoken-load', daemon=True
+                )
+                state['thread'].start()
+    return state['encoder']
+
+
+def _approx_tokens(text: str) -> int:
+    """Rough count (~4 characters per token) used when no encoder is available."""
+    return len(text) // 4 + 1
+
+
+@st.cache_data(show_spinner=False)
+def count_prompt_tokens(text: str, model: str) -> int:
+    """Token count for the (static) system prompt, computed once per prompt text."""
+    return len(get_token_encoder(model).encode_ordinary(text))
+
+
+@st.cache_data(show_spinner=False)
+def load_system_prompt(path: str, mtime: float) -> str:
+    """Read the system prompt once; mtime in the key picks up edits to the file.
+
+    Trailing whitespace is stripped so the prefix is byte-identical across
+    sessions, which lets OpenAI's server-side prompt cache hit.
+    """
+    return Path(path).read_text(encoding='utf-8').rstrip()
+
 
 MODEL_ROLE = 'assistant'
-AI_AVATAR_ICON = str(Path('assets/Knitec_IQ_avatar.png'))
+STREAM_RENDER_INTERVAL = 0.05  # seconds between placeholder redraws while streaming
+TRANSCRIPT_PAGE_SIZE = 50  # history messages rendered per "Load older" step
+MAX_STORED_CHATS = 20  # least recently opened chats beyond this are evicted from the session
+AI_AVATAR_ICON = 'assets/Knitec_IQ_avatar.png'
+PROMPT_PATH = 'assets/prompts/Knitec_IQ_Instructions_Trimmed.txt'
+CHAT_CSS_PATH = 'assets/chat.css'
+FALLBACK_SYSTEM_PROMPT = 'You are Knitec IQ assistant.'
+
+
+def init_session_state() -> None:
+    """Create the per-session working state on first run."""
+    # Session-scoped chat store keyed by chat_id; isolates chats per browser session.
+    # Ordered by last use so long-lived tabs stay bounded to MAX_STORED_CHATS.
+    if 'chat_store' not in st.session_state:
+        st.session_state.chat_store = OrderedDict()
+    if 'chat_id' not in st.session_state:
+        st.session_state.chat_id = f'{time.time()}'
+    if 'chat_title' not in st.session_state:
+        st.session_state.chat_title = 'New Chat'
+    if 'messages' not in st.session_state:
+        st.session_state.messages = []
+    if 'chat_history' not in st.session_state:
+        st.session_state.chat_history = []
+    if 'chat_history_tokens' not in st.session_state:
+        st.session_state.chat_history_tokens = []  # token count per chat_history entry
+
 
-# Session-scoped chat store keyed by chat_id; isolates chats per browser session.
-if 'chat_store' not in st.session_state:
-    st.session_state.chat_store = {}
-if 'chat_id' not in st.session_state:
-    st.session_state.chat_id = f'{time.time()}'
-if 'chat_title' not in st.session_state:
-    st.session_state.chat_title = 'New Chat'
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+@st.cache_data(show_spinner=False)
+def _styles_html(path: str, mtime: float) -> str:
+    """Build the <style> block once; mtime in the key picks up edits to the file."""
+    return f"<style>{Path(path).read_text(encoding='utf-8')}</style>"
 
 
 def inject_chat_styles() -> None:
     """Inject a calmer visual system for chat and sidebar."""
-    st.markdown(
-        """
-        <style>
-          :root {
-            --primary: #1d4ed8;
-            --text: #0f172a;
-            --muted: #475467;
-            --surface: #f7f9fc;
-            --card: #ffffff;
-            --border: #e5e7eb;
-          }
-          html, body, .stApp {
-            background: var(--surface);
-            color: var(--text);
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", "Inter", sans-serif;
-          }
-          .block-container {
-            max-width: 1080px;
-            padding: 24px 32px 140px;
-          }
-          h1 {
-            color: var(--text);
-            font-weight: 700;
-          }
-          h2, h3, h4, h5, h6 {
-            color: var(--text);
-            font-weight: 600;
-          }
-          /* Sidebar */
-          [data-testid="stSidebar"] {
-            background: #f2f4f7;
-            border-right: 1px solid var(--border);
-          }
-          [data-testid="stSidebar"] h1, [data-testid="stSidebar"] h2, [data-testid="stSidebar"] h3 {
-            color: var(--text);
-          }
-          [data-testid="stSidebar"] .stSelectbox > div[data-baseweb="select"] {
-            border-radius: 12px;
-            border: 1px solid var(--border);
-            background: #fff;
-          }
-          [data-testid="stSidebar"] .stTextInput > div > div > input {
-            border-radius: 12px;
-            border: 1px solid var(--border);
-          }
-          /* Chat cards */
-          [data-testid="stChatMessage"] {
-            background: var(--card);
-            border: 1px solid var(--border);
-            border-radius: 16px;
-            padding: 16px;
-            box-shadow: 0 8px 24px rgba(15, 23, 42, 0.06);
-            margin-bottom: 14px;
-          }
-          [data-testid="stChatMessage"] p {
-            color: var(--text);
-            line-height: 1.6;
-          }
-          /* Chat input */
-          textarea, div[data-baseweb="textarea"] textarea {
-            background: #eef1f6 !important;
-            border: 1px solid var(--border) !important;
-            border-radius: 20px !important;
-            color: var(--text) !important;
-            padding: 12px 16px !important;
-          }
-          div[data-baseweb="textarea"] {
-            border-radius: 20px !important;
-            border: 1px solid var(--border) !important;
-            background: #eef1f6 !important;
-          }
-          /* Buttons */
-          .stButton button, button[kind="secondary"], button[kind="primary"] {
-            border-radius: 12px;
-            font-weight: 600;
-          }
-          button[kind="primary"] {
-            background: var(--primary);
-            border-color: var(--primary);
-            color: #fff;
-          }
-          button[kind="secondary"] {
-            background: #eef2ff;
-            border: 1px solid var(--border);
-            color: var(--text);
-          }
-          button:hover {
-            transform: translateY(-1px);
-            box-shadow: 0 10px 22px rgba(29, 78, 216, 0.16);
-          }
-          .chat-footer-note {
-            margin-top: 12px;
-            padding-bottom: 12px;
-            text-align: center;
-            color: var(--muted);
-            font-size: 13px;
-          }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+    # Re-emitted every run: Streamlit drops elements a rerun does not redraw.
+    st.markdown(_styles_html(CHAT_CSS_PATH, os.path.getmtime(CHAT_CSS_PATH)), unsafe_allow_html=True)
 
 
+# Bounded: chat ids are fresh timestamps, so an unbounded cache would grow for the process lifetime.
+@functools.lru_cache(maxsize=1024)
 def default_chat_title(chat_id: str) -> str:
     """Fallback title using timestamp if chat_id is a timestamp; otherwise use generic."""
     try:
@@ -196,36 +162,86 @@ def default_chat_title(chat_id: str) -> str:
         return 'New Chat'
 
 
+_TITLE_RE = re.compile(r'\S+(?:\s+\S+){0,7}')
+
+
 def friendly_title_from_prompt(prompt: str, chat_id: str) -> str:
     """Create a human-friendly title from the first user prompt."""
-    words = (prompt or '').strip().split()
-    if not words:
+    text = (prompt or '').strip()
+    # Match at most 8 words instead of splitting a possibly huge paste.
+    match = _TITLE_RE.match(text)
+    if not match:
         return default_chat_title(chat_id)
-    snippet = ' '.join(words[:8])
-    if len(words) > 8:
-        snippet += '...'
-    return snippet
+    snippet = match.group(0)
+    title = ' '.join(snippet.split())
+    if len(text) > len(snippet):
+        title += '...'
+    return title
 
 
-inject_chat_styles()
-
 # Load chat data from the session store into working state.
 def _load_chat(chat_id: str) -> None:
     chat = st.session_state.chat_store.get(chat_id)
+    st.session_state.chat_id = chat_id
+    st.session_state.pop('transcript_limit', None)
     if chat:
-        st.session_state.chat_id = chat_id
+        # Entries already own their lists, so switching just rebinds them.
         st.session_state.chat_title = chat.get('title') or default_chat_title(chat_id)
-        st.session_state.messages = list(chat.get('messages', []))  # copy to avoid aliasing
-        st.session_state.chat_history = list(chat.get('chat_history', []))  # copy to avoid aliasing
+        st.session_state.messages = chat.get('messages', [])
+        st.session_state.chat_history = chat.get('chat_history', [])
+        st.session_state.chat_history_tokens = chat.get('chat_history_tokens', [])
     else:
-        st.session_state.chat_id = chat_id
         st.session_state.chat_title = default_chat_title(chat_id)
         st.session_state.messages = []
         st.session_state.chat_history = []
+        st.session_state.chat_history_tokens = []
+    # Single canonical entry sharing the working lists; turns are appended in
+    # place rather than re-snapshotting the whole history on every rerun.
+    st.session_state.chat_store[chat_id] = {
+        'title': st.session_state.chat_title,
+        'messages': st.session_state.messages,
+        'chat_history': st.session_state.chat_history,
+        'chat_history_tokens': st.session_state.chat_history_tokens,
+    }
+    st.session_state.chat_store.move_to_end(chat_id)
+    while len(st.session_state.chat_store) > MAX_STORED_CHATS:
+        st.session_state.chat_store.popitem(last=False)
+
+
+def _append_history(role: str, content: str) -> None:
+    """Append to the model-facing history; tokens are counted when the budget needs them."""
+    st.session_state.chat_history.append({'role': role, 'content': content})
+
+
+def _budgeted_history(system_prompt: str) -> list:
+    """Newest-first pack of recent history that fits the input token budget."""
+    encoder = _load_token_encoder()
+    # Count only messages appended since the last request; earlier counts are kept.
+    counts = st.session_state.chat_history_tokens
+    pending = st.session_state.chat_history[len(counts):]
+    if encoder is None:
+        # Approximations are not stored, so these get exact counts once the tokenizer loads.
+        counts = counts + [_approx_tokens(m['content']) for m in pending]
+        system_tokens = _approx_tokens(system_prompt)
+    else:
+        counts.extend(len(encoder.encode_ordinary(m['content'])) for m in pending)
+        system_tokens = count_prompt_tokens(system_prompt, OPENAI_MODEL)
+
+    history = st.session_state.chat_history[-2 * MAX_TURNS:]
+    counts = counts[len(counts) - len(history):]
+    budget = MAX_INPUT_TOKENS - MAX_OUTPUT_TOKENS - system_tokens
+    used = 0
+    kept = 0
+    for count in reversed(counts):
+        if used + count > budget:
+            break
+        used += count
+        kept += 1
+    # Always send the latest message, even if it alone exceeds the budget.
+    kept = max(kept, 1) if history else 0
+    return history[len(history) - kept:]
 
 
-_load_chat(st.session_state.chat_id)
-
 def seed_intro_message() -> None:
     """Ensure a visible intro message and matching history on fresh chats."""
     if st.session_state.messages:
@@ -241,15 +257,7 @@ def seed_intro_message() -> None:
             avatar=AI_AVATAR_ICON,
         )
     )
-    st.session_state.chat_history.append({"role": MODEL_ROLE, "content": intro_msg})
-    st.session_state.chat_store[st.session_state.chat_id] = dict(
-        title=st.session_state.chat_title,
-        messages=list(st.session_state.messages),
-        chat_history=list(st.session_state.chat_history),
-    )
-
-
-seed_intro_message()
+    _append_history(MODEL_ROLE, intro_msg)
 
 
 def _extract_text_piece(content_piece) -> str:
@@ -271,60 +279,73 @@ def _extract_text_piece(content_piece) -> str:
     except Exception:
         return str(content_piece)
 
-# Sidebar: past chats disabled for now (per-session only) to avoid navigation bugs.
-# TODO: Re-enable a reliable past-chats selector once state sync issues are resolved.
-with st.sidebar:
-    st.write('# Chat')
-    if st.button('Start new chat'):
-        fresh_chat_id = f'{time.time()}'
-        st.session_state.chat_store[st.session_state.chat_id] = dict(
-            title=st.session_state.chat_title,
-            messages=list(st.session_state.messages),
-            chat_history=list(st.session_state.chat_history),
+
+def render_sidebar() -> None:
+    # Sidebar: past chats disabled for now (per-session only) to avoid navigation bugs.
+    # TODO: Re-enable a reliable past-chats selector once state sync issues are resolved.
+    with st.sidebar:
+        st.write('# Chat')
+        if st.button('Start new chat'):
+            fresh_chat_id = f'{time.time()}'
+            _load_chat(fresh_chat_id)
+
+        # Drive the keyed widget from state so renames show up on the next run.
+        st.session_state.chat_title_input = st.session_state.chat_title
+        st.text_input(
+            'Chat title',
+            key='chat_title_input',
+            disabled=True,
+            help='Past chats navigation is temporarily disabled.',
         )
-        _load_chat(fresh_chat_id)
-
-    st.text_input(
-        'Chat title',
-        value=st.session_state.chat_title,
-        key='chat_title_input',
-        disabled=True,
-        help='Past chats navigation is temporarily disabled.',
-    )
-    st.session_state.chat_store[st.session_state.chat_id] = dict(
-        title=st.session_state.chat_title,
-        messages=list(st.session_state.messages),
-        chat_history=list(st.session_state.chat_history),
+
+
+def get_system_prompt() -> str:
+    """Load Knitec IQ instructions as system prompt, falling back to a minimal one."""
+    try:
+        return load_system_prompt(PROMPT_PATH, os.path.getmtime(PROMPT_PATH))
+    except FileNotFoundError:
+        st.warning('Prompt file missing; using a minimal fallback prompt.')
+    except Exception as exc:
+        st.warning(f'Could not read prompt file, using fallback. ({exc})')
+    return FALLBACK_SYSTEM_PROMPT
+
+
+def _show_older_messages() -> None:
+    st.session_state.transcript_limit = (
+        st.session_state.get('transcript_limit', TRANSCRIPT_PAGE_SIZE) + TRANSCRIPT_PAGE_SIZE
     )
 
-st.write('# Chat with Knitec IQ')
-
-# Load Knitec IQ instructions as system prompt
-prompt_path = Path('assets/prompts/Knitec_IQ_Instructions_Trimmed.txt')
-try:
-    SYSTEM_PROMPT = prompt_path.read_text()
-except FileNotFoundError:
-    st.warning('Prompt file missing; using a minimal fallback prompt.')
-    SYSTEM_PROMPT = 'You are Knitec IQ assistant.'
-except Exception as exc:
-    st.warning(f'Could not read prompt file, using fallback. ({exc})')
-    SYSTEM_PROMPT = 'You are Knitec IQ assistant.'
-
-# Display chat messages from history on app rerun
-for message in st.session_state.messages:
-    with st.chat_message(
-        name=message['role'],
-        avatar=message.get('avatar'),
-    ):
-        st.markdown(message['content'])
 
-# React to user input
-if prompt := st.chat_input('Your message here...'):
-    # Save this as a chat for later in this session
-    if st.session_state.chat_id not in st.session_state.chat_store:
-        if not st.session_state.chat_title or st.session_state.chat_title == 'New Chat':
-            st.session_state.chat_title = friendly_title_from_prompt(prompt, st.session_state.chat_id)
-    st.session_state.chat_history.append({'role': 'user', 'content': prompt})
+@st.fragment
+def render_transcript() -> None:
+    """Display the most recent chat messages; paging back reruns only this fragment."""
+    messages = st.session_state.messages
+    hidden = len(messages) - st.session_state.get('transcript_limit', TRANSCRIPT_PAGE_SIZE)
+    if hidden > 0:
+        st.button(f'Load older messages ({hidden})', on_click=_show_older_messages)
+    for message in messages[max(hidden, 0):]:
+        with st.chat_message(
+            name=message['role'],
+            avatar=message.get('avatar'),
+        ):
+            st.markdown(message['content'])
+
+
+def _openai_user_id():
+    """Stable hash of the login name for OpenAI's `user` field; the raw name isn't sent."""
+    username = st.session_state.get('username')
+    if not username:
+        return NOT_GIVEN
+    return hashlib.sha256(username.encode('utf-8')).hexdigest()
+
+
+def respond_to_prompt(client: OpenAI, system_prompt: str, prompt: str) -> None:
+    """Record the user's prompt, stream the assistant reply, and store both."""
+    # Name the chat after its first user message
+    if not any(m['role'] == 'user' for m in st.session_state.chat_history):
+        st.session_state.chat_title = friendly_title_from_prompt(prompt, st.session_state.chat_id)
+        st.session_state.chat_store[st.session_state.chat_id]['title'] = st.session_state.chat_title
+    _append_history('user', prompt)
     # Display user message in chat message container
     with st.chat_message('user'):
         st.markdown(prompt)
@@ -335,12 +356,6 @@ if prompt := st.chat_input('Your message here...'):
             content=prompt,
         )
     )
-    # Persist user turn immediately to avoid losing the first message on rerun.
-    st.session_state.chat_store[st.session_state.chat_id] = dict(
-        title=st.session_state.chat_title,
-        messages=list(st.session_state.messages),
-        chat_history=list(st.session_state.chat_history),
-    )
     # Display assistant response immediately with a "thinking" placeholder,
     # then stream tokens into the same message bubble.
     full_response = ''
@@ -352,21 +367,32 @@ if prompt := st.chat_input('Your message here...'):
         message_placeholder.markdown('_Knitec IQ is thinking..._')
 
         try:
+            history = _budgeted_history(system_prompt)
             response = client.chat.completions.create(
                 model=OPENAI_MODEL,
-                messages=[{'role': 'system', 'content': SYSTEM_PROMPT}] + st.session_state.chat_history,
+                messages=[{'role': 'system', 'content': system_prompt}] + history,
                 stream=True,
+                user=_openai_user_id(),
             )
 
+            # Pick the extractor from the first piece: text-only streams stay on the str fast path.
+            extract = None
+            last_render = 0.0
+            parts = []
             for chunk in response:
                 delta = chunk.choices[0].delta
                 content_piece = getattr(delta, 'content', None) or ''
                 if not content_piece:
                     continue
-                text_piece = _extract_text_piece(content_piece)
-                full_response += text_piece
-                message_placeholder.markdown(full_response + '▌')
-
+                if extract is None:
+                    extract = str if isinstance(content_piece, str) else _extract_text_piece
+                parts.append(extract(content_piece))
+                now = time.monotonic()
+                if now - last_render >= STREAM_RENDER_INTERVAL:
+                    message_placeholder.markdown(''.join(parts) + '▌')
+                    last_render = now
+
+            full_response = ''.join(parts)
             if not full_response:
                 full_response = '(No response.)'
             message_placeholder.markdown(full_response)
@@ -383,15 +409,46 @@ if prompt := st.chat_input('Your message here...'):
         )
     )
     if full_response and full_response != '(No response due to API error.)':
-        st.session_state.chat_history.append({'role': 'assistant', 'content': full_response})
+        _append_history('assistant', full_response)
 
-    st.session_state.chat_store[st.session_state.chat_id] = dict(
-        title=st.session_state.chat_title,
-        messages=list(st.session_state.messages),
-        chat_history=list(st.session_state.chat_history),
+
+def main() -> None:
+    # --- Authentication gate ----------------------------------------------------
+    require_auth()
+
+    api_key = st.secrets.get('OPENAI_API_KEY') or os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        st.error('OPENAI_API_KEY is not set; please configure your environment (Streamlit secrets or env var).')
+        st.stop()
+    client = get_openai_client(api_key)
+    # Start the tokenizer load now so exact counts are usually ready by the first prompt.
+    _load_token_encoder()
+
+    init_session_state()
+    inject_chat_styles()
+    if st.session_state.chat_id not in st.session_state.chat_store:
+        _load_chat(st.session_state.chat_id)
+    seed_intro_message()
+    render_sidebar()
+
+    st.write('# Chat with Knitec IQ')
+    system_prompt = get_system_prompt()
+
+    # Display chat messages from history on app rerun
+    render_transcript()
+
+    # React to user input
+    if prompt := st.chat_input('Your message here...'):
+        respond_to_prompt(client, system_prompt, prompt)
+        # Redraw the stored turn inside the transcript fragment. The live bubbles sit
+        # outside it and would linger under a fragment-only "Load older messages" rerun.
+        st.rerun()
+
+    st.markdown(
+        '<div class="chat-footer-note">KnitecIQ can make mistakes—please double-check important information.</div>',
+        unsafe_allow_html=True,
     )
 
-st.markdown(
-    '<div class="chat-footer-note">KnitecIQ can make mistakes—please double-check important information.</div>',
-    unsafe_allow_html=True,
-)
+
+if __name__ == '__main__':
+    main()
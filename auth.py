@@ -0,0 +1,54 @@
+"""
+Shared login gate for the contact intake and chat pages.
+"""
+from __future__ import annotations
+
+import json
+
+import streamlit as st
+import streamlit_authenticator as stauth
+
+
+def _to_plain(obj):
+    """Convert secrets mappings to plain dicts/lists to avoid mutation issues."""
+    # One C-level JSON round trip; nested secrets mappings are expanded via default.
+    return json.loads(json.dumps(obj, default=lambda o: dict(o.items())))
+
+
+def _get_plain_auth() -> dict | None:
+    """Read the auth secrets each run so credential edits apply without a restart."""
+    auth_config = st.secrets.get("auth")
+    if not auth_config:
+        return None
+    return _to_plain(auth_config)
+
+
+def require_auth() -> None:
+    """Authenticate the user; stop rendering if unauthenticated."""
+    auth_config = _get_plain_auth()
+    if not auth_config:
+        st.error("Auth configuration missing in secrets.")
+        st.stop()
+
+    # Built per run: the authenticator's cookie manager is a per-session component.
+    authenticator = stauth.Authenticate(
+        auth_config["credentials"],
+        auth_config["cookie"]["name"],
+        auth_config["cookie"]["key"],
+        auth_config["cookie"]["expiry_days"],
+    )
+
+    authenticator.login(
+        fields={"Form name": "Login"},
+        location="main",
+    )
+    auth_status = st.session_state.get("authentication_status")
+
+    if auth_status is False:
+        st.error("Invalid username or password.")
+        st.stop()
+    elif auth_status is None:
+        st.warning("Please enter your credentials.")
+        st.stop()
+    else:
+        authenticator.logout("Logout", "sidebar")
@@ -1,26 +1,27 @@
 from __future__ import annotations
 
-import base64
+import functools
 import re
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Callable, Dict, Tuple
 
 import streamlit as st
-import streamlit_authenticator as stauth
 
+from auth import require_auth
 
-# Keep this page self-contained so it can be dropped in as a module.
-st.set_page_config(page_title="Knitec IQ | Contact Info", layout="wide")
 
+# Relies on the repo-root auth.py and static/images/ alongside its own assets.
+PAGE_TITLE = "Knitec IQ | Contact Info"
 APP_DIR = Path(__file__).resolve().parent
 ASSETS_DIR = APP_DIR / "assets"
 CSS_PATH = ASSETS_DIR / "css" / "style.css"
-HERO_IMAGE = ASSETS_DIR / "images" / "home_background.png"
-LOGO_IMAGE = ASSETS_DIR / "images" / "logo.png"
+# Images are served by Streamlit's static file server (server.enableStaticServing)
+# from <repo>/static, so the browser fetches and caches them over plain HTTP.
+STATIC_IMAGES_URL = "app/static/images"
+HERO_URL = f"{STATIC_IMAGES_URL}/home_background.png"
+LOGO_URL = f"{STATIC_IMAGES_URL}/logo.png"
 CHAT_URL = "https://kniteciq-demo.streamlit.app/Chat_with_KnitecIQ"
 
-st.session_state.setdefault("handoff_modal_shown", False)
-
 FIELD_META: Tuple[Tuple[str, str, str], ...] = (
     ("name", "Name", "Jane Doe"),
     ("address", "Address", "123 Main St"),
@@ -30,111 +31,89 @@ FIELD_META: Tuple[Tuple[str, str, str], ...] = (
     ("contact", "Contact", "Primary phone or email"),
     ("contact2", "Contact 2", "Secondary phone or email"),
 )
+# Fields alternate between the two form columns; split once instead of per render.
+_LEFT_FIELDS = FIELD_META[0::2]
+_RIGHT_FIELDS = FIELD_META[1::2]
 
+# An email address, or any text carrying 7-15 digits (a phone number with punctuation).
+_CONTACT_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+|\D*(?:\d\D*){7,15}")
 
-def _to_plain(obj):
-    """Convert secrets mappings to plain dicts/lists to avoid mutation issues."""
-    if isinstance(obj, dict):
-        return {k: _to_plain(v) for k, v in obj.items()}
-    try:
-        return {k: _to_plain(v) for k, v in obj.items()}
-    except Exception:
-        return obj
-
-
-def require_auth() -> None:
-    """Authenticate the user; stop rendering if unauthenticated."""
-    auth_config = st.secrets.get("auth")
-    if not auth_config:
-        st.error("Auth configuration missing in secrets.")
-        st.stop()
-
-    auth_config = _to_plain(auth_config)
-    authenticator = stauth.Authenticate(
-        auth_config["credentials"],
-        auth_config["cookie"]["name"],
-        auth_config["cookie"]["key"],
-        auth_config["cookie"]["expiry_days"],
-    )
+# Required fields with their messages, formatted once; a tuple keeps error order stable.
+_REQUIRED_ERRORS: Tuple[Tuple[str, str], ...] = tuple(
+    (key, f"{key.title()} is required.")
+    for key in ("name", "address", "city", "state", "zip", "contact")
+)
 
-    authenticator.login(
-        fields={"Form name": "Login"},
-        location="main",
-    )
-    auth_status = st.session_state.get("authentication_status")
 
-    if auth_status is False:
-        st.error("Invalid username or password.")
-        st.stop()
-    elif auth_status is None:
-        st.warning("Please enter your credentials.")
-        st.stop()
-    else:
-        authenticator.logout("Logout", "sidebar")
+def _is_state(text: str) -> bool:
+    """Two ASCII letters, e.g. WA; same as fullmatch [A-Za-z]{2}."""
+    return len(text) == 2 and text.isascii() and text.isalpha()
 
 
-def _as_data_uri(path: Path) -> str:
-    """Return a data URI for the given asset."""
-    mime = "image/png" if path.suffix.lower() == ".png" else "image/jpeg"
-    encoded = base64.b64encode(path.read_bytes()).decode()
-    return f"data:{mime};base64,{encoded}"
+def _is_zip(text: str) -> bool:
+    """ZIP or ZIP+4; isdecimal() matches exactly what regex \\d does."""
+    if len(text) == 5:
+        return text.isdecimal()
+    return len(text) == 10 and text[5] == "-" and text[:5].isdecimal() and text[6:].isdecimal()
 
 
-def inject_branding() -> Dict[str, str]:
-    """Inject CSS with inlined images; return data URIs for reuse."""
-    logo_uri = _as_data_uri(LOGO_IMAGE)
-    hero_uri = _as_data_uri(HERO_IMAGE)
+# Format checks for optional-or-required fields, applied only when a value is present.
+_VALIDATORS: Dict[str, Tuple[Callable[[str], object], str]] = {
+    "state": (_is_state, "State must be a 2-letter code (e.g., WA)."),
+    "zip": (_is_zip, "Zip must be 5 digits or ZIP+4 (e.g., 98101 or 98101-1234)."),
+    "contact": (_CONTACT_RE.fullmatch, "Contact must be an email or phone number."),
+    "contact2": (_CONTACT_RE.fullmatch, "Contact 2 must be an email or phone number."),
+}
+
 
+@functools.lru_cache(maxsize=8)
+def _build_css(css_mtime: float) -> str:
+    """Return the page CSS with image references pointed at the static server."""
     css = CSS_PATH.read_text()
-    css = css.replace("../images/home_background.png", hero_uri)
-    css = css.replace("../images/logo.png", logo_uri)
-    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+    css = css.replace("../images/home_background.png", HERO_URL)
+    return css.replace("../images/logo.png", LOGO_URL)
 
-    # Provide a small helper style for the logo in the header.
-    st.markdown(
-        f"""
-        <style>
-          .brand-mark img {{
-            content: url("{logo_uri}");
-          }}
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
-    return {"logo": logo_uri, "hero": hero_uri}
 
+def inject_branding() -> Dict[str, str]:
+    """Inject CSS referencing the static images; return their URLs for reuse."""
+    css = _build_css(CSS_PATH.stat().st_mtime)
+    # One <style> element; the header <img> already points at LOGO_URL, so no
+    # separate `.brand-mark img { content: url(...) }` override is needed.
+    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+    return {"logo": LOGO_URL, "hero": HERO_URL}
 
-def render_header(logo_uri: str) -> None:
-    st.markdown(
-        f"""
+
+@functools.lru_cache(maxsize=8)
+def _header_html(logo_uri: str) -> str:
+    return f"""
         <header class="header-bar">
           <div class="brand-mark">
             <img src="{logo_uri}" alt="Knitec logo">
           </div>
         </header>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
 
 
-def render_hero() -> None:
-    st.markdown(
-        """
+def render_header(logo_uri: str) -> None:
+    st.markdown(_header_html(logo_uri), unsafe_allow_html=True)
+
+
+_HERO_HTML = """
         <section class="hero-section">
           <div class="hero-overlay"></div>
           <div class="hero-content">
             <h1>Property &amp; Contact Information</h1>
           </div>
         </section>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
 
 
-def show_handoff_modal() -> None:
-    """Show a handoff popup with a CTA to open the chat app."""
-    st.markdown(
-        f"""
+def render_hero() -> None:
+    st.markdown(_HERO_HTML, unsafe_allow_html=True)
+
+
+# Static apart from CHAT_URL, so the modal markup is formatted once at import.
+_HANDOFF_HTML = f"""
         <style>
           .handoff-modal {{
             position: fixed;
@@ -202,9 +181,12 @@ def show_handoff_modal() -> None:
             <a class="handoff-cta" href="{CHAT_URL}">Let's chat →</a>
           </div>
         </div>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
+
+
+def show_handoff_modal() -> None:
+    """Show a handoff popup with a CTA to open the chat app."""
+    st.markdown(_HANDOFF_HTML, unsafe_allow_html=True)
 
 
 def render_form() -> None:
@@ -218,13 +200,11 @@ def render_form() -> None:
         values = {}
 
         # Collect inputs in a grid-like layout.
-        for idx, (key, label, placeholder) in enumerate(FIELD_META):
-            target_col = col_a if idx % 2 == 0 else col_b
-            values[key] = target_col.text_input(
-                label,
-                key=f"contact_{key}",
-                placeholder=placeholder,
-            )
+        text_a, text_b = col_a.text_input, col_b.text_input
+        for key, label, placeholder in _LEFT_FIELDS:
+            values[key] = text_a(label, key=f"contact_{key}", placeholder=placeholder)
+        for key, label, placeholder in _RIGHT_FIELDS:
+            values[key] = text_b(label, key=f"contact_{key}", placeholder=placeholder)
 
         action_a, action_b = st.columns(2, gap="small")
         submitted = action_a.form_submit_button(
@@ -240,13 +220,15 @@ def render_form() -> None:
     st.markdown("</div>", unsafe_allow_html=True)
 
     if submitted:
-        sanitized = {k: (v or "").strip() for k, v in values.items()}
-        errors = validate_inputs(sanitized)
+        # text_input always returns str, so strip in place without a new dict.
+        for key, value in values.items():
+            values[key] = value.strip()
+        errors = validate_inputs(values)
         if errors:
             st.error("Please fix the following:\n- " + "\n- ".join(errors))
             return
 
-        st.session_state["contact_info"] = sanitized
+        st.session_state["contact_info"] = values
         st.session_state["contact_info_submitted"] = True
         st.session_state["handoff_modal_shown"] = True
         st.success("Contact info captured. Knitec IQ is gonna take it from here.")
@@ -255,41 +237,16 @@ def render_form() -> None:
 
 def validate_inputs(values: Dict[str, str]) -> list[str]:
     """Return a list of validation error messages."""
-    errors = []
-
-    required_keys = ("name", "address", "city", "state", "zip", "contact")
-    for key in required_keys:
-        if not values.get(key):
-            errors.append(f"{key.title()} is required.")
-
-    state_val = values.get("state", "")
-    if state_val and not re.fullmatch(r"[A-Za-z]{2}", state_val):
-        errors.append("State must be a 2-letter code (e.g., WA).")
-
-    zip_val = values.get("zip", "")
-    if zip_val and not re.fullmatch(r"\d{5}(?:-\d{4})?$", zip_val):
-        errors.append("Zip must be 5 digits or ZIP+4 (e.g., 98101 or 98101-1234).")
+    errors = [message for key, message in _REQUIRED_ERRORS if not values.get(key)]
 
-    contact_val = values.get("contact", "")
-    if contact_val and not (_looks_like_email(contact_val) or _looks_like_phone(contact_val)):
-        errors.append("Contact must be an email or phone number.")
-
-    contact2_val = values.get("contact2", "")
-    if contact2_val and not (_looks_like_email(contact2_val) or _looks_like_phone(contact2_val)):
-        errors.append("Contact 2 must be an email or phone number.")
+    for key, (is_valid, message) in _VALIDATORS.items():
+        value = values.get(key, "")
+        if value and not is_valid(value):
+            errors.append(message)
 
     return errors
 
 
-def _looks_like_email(text: str) -> bool:
-    return bool(re.fullmatch(r"[^@\s]+@[^@\s]+\.[^@\s]+", text))
-
-
-def _looks_like_phone(text: str) -> bool:
-    digits = re.sub(r"\D", "", text)
-    return 7 <= len(digits) <= 15
-
-
 def navigate_to_chat() -> None:
     """
     Try to jump to the chatbot page automatically. Falls back to a JS redirect.
@@ -345,6 +302,10 @@ def navigate_to_chat() -> None:
 
 
 def main() -> None:
+    # Configure the page as the first command of every run. At module level this
+    # only ran on the first import, so later sessions and reruns skipped it.
+    st.set_page_config(page_title=PAGE_TITLE, layout="wide")
+    st.session_state.setdefault("handoff_modal_shown", False)
     require_auth()
     if st.session_state.get("contact_info_submitted") and not st.session_state.get("handoff_modal_shown"):
         show_handoff_modal()
@@ -353,7 +314,3 @@ def main() -> None:
     render_header(brand_uris["logo"])
     render_hero()
     render_form()
-
-
-if __name__ == "__main__":
-    main()
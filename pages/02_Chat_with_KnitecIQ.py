@@ -1,15 +1,19 @@
 """
 Streamlit page wrapper to run the existing chatbot.
 """
-import runpy
+import sys
 from pathlib import Path
 
 
 def main():
     root = Path(__file__).resolve().parents[1]
-    chat_path = root / "app_chat.py"
-    # Execute the chatbot script in this page's context.
-    runpy.run_path(str(chat_path), run_name="__main__")
+    # Make root-level modules (e.g. auth, app_chat) importable when this page is run directly.
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    # Imported once per process; later reruns reuse the compiled module and only call main().
+    import app_chat
+
+    app_chat.main()
 
 
 if __name__ == "__main__":